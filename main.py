@@ -6,15 +6,22 @@
 #  |________/(______/__|  |__| |____/\_____>______>___|__(______/__|__\\_____>
 #
 # This is a nice home for our Battlesnake called Hunter.
+#
+# Every move builds one occupancy grid, runs a single BFS from the head over it
+# (bfs_from) and reads the path to each target from its parents (get_path_to).
+# find_path wraps the same two for a single target.
 
 import random
 import typing
-import heapq
+import functools
+import threading
+from collections import deque, namedtuple
 from server import run_server
 
 # Important global variables
 DIRECTIONS = {"up": (0, 1), "down": (0, -1), "left": (-1, 0), "right": (1, 0)}
 POSSIBLE_MOVES = list(DIRECTIONS.keys())
+DELTA_TO_MOVE = {delta: move for move, delta in DIRECTIONS.items()}
 
 # Thresholds for decision making
 LOW_HEALTH_THRESHOLD = 30  # Health level at which snake prioritizes finding food
@@ -22,15 +29,47 @@ LENGTH_ADVANTAGE_THRESHOLD = (
     2  # Minimum length advantage to consider chasing other snakes
 )
 
+# Response to the info request, it never changes
+INFO = {
+    "apiversion": "1",
+    "author": "Gruppe 7",
+    "color": "#888888",
+    "head": "default",
+    "tail": "default",
+}
+
+# Occupancy grid cell values, higher is more dangerous; anything but FREE is unsafe
+FREE = 0
+HEAD_DANGER = 1  # Next to the head of a snake at least as long as us
+BODY = 2
+WALL = 3  # Never stored in the grid, used for moves off the board
+
+# Marker for cells the path search has not reached
+UNSEEN = -1
+
+
+class Scratch(threading.local):
+    """
+    The BFS queue, reused instead of allocating a new one on every move. The
+    server may handle requests on several threads, so every thread gets its
+    own queue.
+    """
+
+    def __init__(self):
+        self.queue = deque()
+
+
+SCRATCH = Scratch()
+
+# Per-turn board information shared by the move helpers
+Context = namedtuple(
+    "Context",
+    ["grid", "width", "height", "head", "neck", "snake_lengths"],
+)
+
 
 def info() -> typing.Dict:
-    return {
-        "apiversion": "1",
-        "author": "Gruppe 7",
-        "color": "#888888",
-        "head": "default",
-        "tail": "default",
-    }
+    return INFO
 
 
 def start(game_state: typing.Dict):
@@ -42,141 +81,250 @@ def end(game_state: typing.Dict):
     print(f"Snake length: {len(game_state['you']['body'])}")
 
 
-def manhattan_distance(a, b):
-    return abs(a[0] - b[0]) + abs(a[1] - b[1])
-
-
-def is_safe(x: int, y: int, game_state: typing.Dict) -> bool:
+def build_occupancy(game_state: typing.Dict, dangerous_heads: list) -> bytearray:
     """
-    Determines if a given position is safe for the snake to move to.
+    Builds the occupancy grid for the current turn.
+
+    Every snake body segment is marked as blocked, as well as the cells next
+    to the given heads (possible head-to-head collisions). Tails are left
+    free since they move on next turn, unless another snake's head is next
+    to food: if it eats, it grows and its tail stays where it is. A snake
+    that ate last turn needs no special case, its tail segment is already
+    doubled up. Our own tail stays free, we cannot eat and step onto it in
+    the same move.
 
     Args:
-        x (int): The x-coordinate to check.
-        y (int): The y-coordinate to check.
         game_state (dict): The current game state.
+        dangerous_heads (list): The (x, y) heads of the other snakes that are
+            at least as long as we are.
 
     Returns:
-        bool: True if the position is safe, False otherwise.
+        bytearray: A flat grid of size width * height, indexed by y * width + x,
+            holding FREE, BODY or HEAD_DANGER for every cell.
     """
     board_width = game_state["board"]["width"]
     board_height = game_state["board"]["height"]
-    my_body = game_state["you"]["body"]
-
-    # Check board boundaries
-    if x < 0 or y < 0 or x >= board_width or y >= board_height:
-        return False
+    my_id = game_state["you"]["id"]
+    food = {(f["x"], f["y"]) for f in game_state["board"]["food"]}
+    grid = bytearray(board_width * board_height)
 
-    # Check self-collision
-    if any(part["x"] == x and part["y"] == y for part in my_body[:-1]):
-        return False
+    # Mark possible head-to-head collisions first, so bodies take precedence
+    for head_x, head_y in dangerous_heads:
+        for dx, dy in DIRECTIONS.values():
+            x, y = head_x + dx, head_y + dy
+            if 0 <= x < board_width and 0 <= y < board_height:
+                grid[y * board_width + x] = HEAD_DANGER
 
-    # Check other snakes
     for snake in game_state["board"]["snakes"]:
-        if snake["id"] != game_state["you"]["id"]:
-            # Check body collision
-            if any(manhattan_distance((part["x"], part["y"]), (x, y)) == 1 for part in snake["body"][:-1]):
-                return False
-            # Check head-to-head collision
-            if (
-                len(snake["body"]) >= len(my_body)
-                and manhattan_distance((snake["body"][0]["x"], snake["body"][0]["y"]), (x, y))
-                == 1
-            ):
-                return False
-
-    return True
-
-
-def get_safe_moves(game_state: typing.Dict) -> list:
+        body = snake["body"]
+        head_x, head_y = body[0]["x"], body[0]["y"]
+        can_eat = snake["id"] != my_id and any(
+            (head_x + dx, head_y + dy) in food for dx, dy in DIRECTIONS.values()
+        )
+        if not can_eat:
+            body = body[:-1]
+        for part in body:
+            grid[part["y"] * board_width + part["x"]] = BODY
+
+    return grid
+
+
+@functools.lru_cache(maxsize=None)
+def get_move_table(board_width: int, board_height: int) -> tuple:
+    """
+    Lists the in-bounds moves of every cell of a board.
+
+    The board keeps its size for the whole game, so the table is only built
+    once and neither the move checks nor the path search have to do bounds
+    checks.
+
+    Args:
+        board_width (int): The width of the board.
+        board_height (int): The height of the board.
+
+    Returns:
+        tuple: For every cell index y * width + x, a tuple of (move, index)
+            pairs for its neighbours in DIRECTIONS order.
+    """
+    table = []
+    for y in range(board_height):
+        for x in range(board_width):
+            table.append(
+                tuple(
+                    (move, (y + dy) * board_width + x + dx)
+                    for move, (dx, dy) in DIRECTIONS.items()
+                    if 0 <= x + dx < board_width and 0 <= y + dy < board_height
+                )
+            )
+    return tuple(table)
+
+
+@functools.lru_cache(maxsize=None)
+def get_neighbor_table(board_width: int, board_height: int) -> tuple:
+    """
+    Lists the in-bounds neighbours of every cell of a board.
+
+    Args:
+        board_width (int): The width of the board.
+        board_height (int): The height of the board.
+
+    Returns:
+        tuple: For every cell index y * width + x, a tuple with the indices of
+            its neighbours in DIRECTIONS order.
+    """
+    return tuple(
+        tuple(index for _, index in moves)
+        for moves in get_move_table(board_width, board_height)
+    )
+
+
+def get_least_bad_move(ctx: Context) -> str:
+    """
+    Determines the least dangerous move when no move is safe.
+
+    A possible head-to-head collision is preferred, since the other snake may
+    not move there, then running into a body, then leaving the board. Moving
+    back into our own neck is never considered.
+
+    Args:
+        ctx (Context): The precomputed board information of the current turn.
+
+    Returns:
+        str: The move direction into the least dangerous cell.
+    """
+    head_x, head_y = ctx.head
+
+    def danger(move: str) -> int:
+        dx, dy = DIRECTIONS[move]
+        x, y = head_x + dx, head_y + dy
+        if not (0 <= x < ctx.width and 0 <= y < ctx.height):
+            return WALL
+        return ctx.grid[y * ctx.width + x]
+
+    candidates = [
+        move
+        for move, (dx, dy) in DIRECTIONS.items()
+        if (head_x + dx, head_y + dy) != ctx.neck
+    ]
+    return min(candidates, key=danger)
+
+
+def get_safe_moves(ctx: Context) -> list:
     """
     Determines all safe moves for the snake based on the current game state.
 
     Args:
-        game_state (dict): The current game state.
+        ctx (Context): The precomputed board information of the current turn.
 
     Returns:
         list: A list of safe moves.
     """
-    my_head = game_state["you"]["body"][0]
-    my_neck = game_state["you"]["body"][1]
+    board_width = ctx.width
+    grid = ctx.grid
+    head_index = ctx.head[1] * board_width + ctx.head[0]
+    neck_index = ctx.neck[1] * board_width + ctx.neck[0]
+
+    # Never move backwards into the neck
+    return [
+        move
+        for move, index in get_move_table(board_width, ctx.height)[head_index]
+        if index != neck_index and not grid[index]
+    ]
+
+
+def bfs_from(start: tuple, ctx: Context) -> tuple:
+    """
+    Runs a single BFS from start over the whole board.
+
+    Unsafe cells can end a path (e.g. a tail that will have moved on by the
+    time we get there) but are never walked through.
 
-    safe_moves = []
+    Args:
+        start (tuple): The starting position (x, y).
+        ctx (Context): The precomputed board information of the current turn.
 
-    for move, (dx, dy) in DIRECTIONS.items():
-        # Prevent moving backwards
-        if (
-            (move == "up" and my_neck["y"] > my_head["y"])
-            or (move == "down" and my_neck["y"] < my_head["y"])
-            or (move == "left" and my_neck["x"] < my_head["x"])
-            or (move == "right" and my_neck["x"] > my_head["x"])
-        ):
-            continue
+    Returns:
+        tuple: The parent index and the distance from start of every cell,
+            both UNSEEN for cells that cannot be reached.
+    """
+    board_width = ctx.width
+    grid = ctx.grid
+    neighbors = get_neighbor_table(board_width, ctx.height)
+    start_index = start[1] * board_width + start[0]
+
+    # The start is its own parent
+    parents = [UNSEEN] * len(neighbors)
+    distances = [UNSEEN] * len(neighbors)
+    parents[start_index] = start_index
+    distances[start_index] = 0
+    queue = SCRATCH.queue
+    queue.clear()
+    queue.append(start_index)
+
+    while queue:
+        current = queue.popleft()
+        distance = distances[current] + 1
+        for neighbor in neighbors[current]:
+            if parents[neighbor] == UNSEEN:
+                parents[neighbor] = current
+                distances[neighbor] = distance
+                if not grid[neighbor]:
+                    queue.append(neighbor)
+
+    return parents, distances
+
+
+def get_path_to(goal: tuple, parents: list, ctx: Context) -> list:
+    """
+    Reconstructs the path to goal from the parents of a BFS.
 
-        new_x, new_y = my_head["x"] + dx, my_head["y"] + dy
+    Args:
+        goal (tuple): The goal position (x, y).
+        parents (list): The parent index of every cell, as returned by bfs_from.
+        ctx (Context): The precomputed board information of the current turn.
 
-        if is_safe(new_x, new_y, game_state):
-            safe_moves.append(move)
+    Returns:
+        list: A list of coordinates representing the path, or None if the goal
+            cannot be reached.
+    """
+    board_width = ctx.width
+    index = goal[1] * board_width + goal[0]
+    if parents[index] == UNSEEN:
+        return None
 
-    return safe_moves
+    indices = [index]
+    while parents[index] != index:
+        index = parents[index]
+        indices.append(index)
+    return [(index % board_width, index // board_width) for index in reversed(indices)]
 
 
-def find_path(start: tuple, goal: tuple, game_state: typing.Dict) -> list:
+def find_path(start: tuple, goal: tuple, ctx: Context) -> list:
     """
-    Finds a path from start to goal using the A* algorithm.
+    Finds a shortest path from start to goal.
+
+    move() runs bfs_from once and looks up every target in its result; this
+    is the same search for when only a single target is needed.
 
     Args:
         start (tuple): The starting position (x, y).
         goal (tuple): The goal position (x, y).
-        game_state (dict): The current game state.
+        ctx (Context): The precomputed board information of the current turn.
 
     Returns:
         list: A list of coordinates representing the path, or None if no path is found.
     """
+    parents, _ = bfs_from(start, ctx)
+    return get_path_to(goal, parents, ctx)
 
-    def get_neighbors(pos):
-        x, y = pos
-        for dx, dy in DIRECTIONS.values():
-            nx, ny = x + dx, y + dy
-            if is_safe(nx, ny, game_state):
-                yield (nx, ny)
-
-    heap = [(0, start)]
-    came_from = {}
-    g_score = {start: 0}
-    f_score = {start: manhattan_distance(start, goal)}
-
-    while heap:
-        current = heapq.heappop(heap)[1]
-
-        if current == goal:
-            path = []
-            while current in came_from:
-                path.append(current)
-                current = came_from[current]
-            path.append(start)
-            return path[::-1]
-
-        for neighbor in get_neighbors(current):
-            tentative_g_score = g_score[current] + 1
-
-            if neighbor not in g_score or tentative_g_score < g_score[neighbor]:
-                came_from[neighbor] = current
-                g_score[neighbor] = tentative_g_score
-                f_score[neighbor] = g_score[neighbor] + manhattan_distance(
-                    neighbor, goal
-                )
-                heapq.heappush(heap, (f_score[neighbor], neighbor))
-
-    return None
 
-
-def get_move_from_path(path: list, my_head: dict) -> str:
+def get_move_from_path(path: list, my_head: tuple) -> str:
     """
     Determines the next move based on the given path and current head position.
 
     Args:
         path (list): A list of coordinates representing the path.
-        my_head (dict): The current position of the snake's head.
+        my_head (tuple): The current position (x, y) of the snake's head.
 
     Returns:
         str: The next move direction, or None if the path is invalid.
@@ -184,68 +332,75 @@ def get_move_from_path(path: list, my_head: dict) -> str:
     if not path or len(path) < 2:
         return None
     next_move = path[1]
-    if next_move[0] > my_head["x"]:
-        return "right"
-    elif next_move[0] < my_head["x"]:
-        return "left"
-    elif next_move[1] > my_head["y"]:
-        return "up"
-    elif next_move[1] < my_head["y"]:
-        return "down"
+    return DELTA_TO_MOVE.get((next_move[0] - my_head[0], next_move[1] - my_head[1]))
 
 
-def seek_food(game_state: typing.Dict, safe_moves: list) -> str:
+def seek_food(
+    game_state: typing.Dict,
+    safe_moves: list,
+    ctx: Context,
+    parents: list,
+    distances: list,
+) -> str:
     """
-    Determines the next move to seek the closest food.
+    Determines the next move to seek the closest reachable food.
+
+    Food is tried in order of path distance, so food whose path starts with
+    an unsafe move does not stop us from going for the next closest one.
 
     Args:
         game_state (dict): The current game state.
         safe_moves (list): A list of safe moves.
+        ctx (Context): The precomputed board information of the current turn.
+        parents (list): The parent index of every cell, as returned by bfs_from.
+        distances (list): The distance of every cell, as returned by bfs_from.
 
     Returns:
         str: The next move direction to seek food, or None if no suitable move is found.
     """
-    my_head = game_state["you"]["body"][0]
-    food = game_state["board"]["food"]
-    if food:
-        closest_food = min(
-            food,
-            key=lambda f: manhattan_distance((f["x"], f["y"]), (my_head["x"], my_head["y"])),
-        )
-        path_to_food = find_path(
-            (my_head["x"], my_head["y"]),
-            (closest_food["x"], closest_food["y"]),
-            game_state,
-        )
-        if path_to_food:
-            move = get_move_from_path(path_to_food, my_head)
-            if move in safe_moves:
-                print("Seeking food")
-                return move
+    board_width = ctx.width
+    reachable_food = sorted(
+        (
+            (f["x"], f["y"])
+            for f in game_state["board"]["food"]
+            if distances[f["y"] * board_width + f["x"]] != UNSEEN
+        ),
+        key=lambda f: distances[f[1] * board_width + f[0]],
+    )
+    for f in reachable_food:
+        path_to_food = get_path_to(f, parents, ctx)
+        move = get_move_from_path(path_to_food, ctx.head)
+        if move in safe_moves:
+            print("Seeking food")
+            return move
     return None
 
 
-def chase_smaller_snake(game_state: typing.Dict, safe_moves: list) -> str:
+def chase_smaller_snake(
+    game_state: typing.Dict,
+    safe_moves: list,
+    ctx: Context,
+    parents: list,
+) -> str:
     """
     Determines the next move to chase a smaller snake.
 
     Args:
         game_state (dict): The current game state.
         safe_moves (list): A list of safe moves.
+        ctx (Context): The precomputed board information of the current turn.
+        parents (list): The parent index of every cell, as returned by bfs_from.
 
     Returns:
         str: The next move direction to chase a smaller snake, or None if no suitable move is found.
     """
-    my_head = game_state["you"]["body"][0]
-    my_length = len(game_state["you"]["body"])
+    my_length = ctx.snake_lengths[game_state["you"]["id"]]
     for snake in game_state["board"]["snakes"]:
-        if len(snake["body"]) < my_length:
+        if ctx.snake_lengths[snake["id"]] < my_length:
             tail = snake["body"][-1]
-            path_to_tail = find_path(
-                (my_head["x"], my_head["y"]), (tail["x"], tail["y"]), game_state
-            )
+            path_to_tail = get_path_to((tail["x"], tail["y"]), parents, ctx)
             if path_to_tail:
-                move = get_move_from_path(path_to_tail, my_head)
+                move = get_move_from_path(path_to_tail, ctx.head)
                 if move in safe_moves:
                     print("Chasing a smaller snake")
                     return move
@@ -262,32 +417,59 @@ def move(game_state: typing.Dict) -> typing.Dict:
     Returns:
         dict: A dictionary containing the next move.
     """
-    safe_moves = get_safe_moves(game_state)
+    board = game_state["board"]
+    board_width = board["width"]
+    board_height = board["height"]
+    snakes = board["snakes"]
+    my_id = game_state["you"]["id"]
+    my_body = game_state["you"]["body"]
+    my_length = len(my_body)
+    snake_lengths = {snake["id"]: len(snake["body"]) for snake in snakes}
+    dangerous_heads = [
+        (snake["body"][0]["x"], snake["body"][0]["y"])
+        for snake in snakes
+        if snake["id"] != my_id and snake_lengths[snake["id"]] >= my_length
+    ]
+    grid = build_occupancy(game_state, dangerous_heads)
+    ctx = Context(
+        grid,
+        board_width,
+        board_height,
+        (my_body[0]["x"], my_body[0]["y"]),
+        (my_body[1]["x"], my_body[1]["y"]),
+        snake_lengths,
+    )
+    safe_moves = get_safe_moves(ctx)
 
     if not safe_moves:
-        print("No safe moves. Making a random move")
-        return {"move": random.choice(POSSIBLE_MOVES)}
+        print("No safe moves. Making the least bad move")
+        return {"move": get_least_bad_move(ctx)}
+
+    # The move is forced, no need to look for food or other snakes
+    if len(safe_moves) == 1:
+        print("Only one safe move")
+        return {"move": safe_moves[0]}
+
+    # One search from the head serves both food and chase targets
+    parents, distances = bfs_from(ctx.head, ctx)
 
     my_health = game_state["you"]["health"]
-    my_length = len(game_state["you"]["body"])
-    other_snakes_lengths = [
-        len(snake["body"])
-        for snake in game_state["board"]["snakes"]
-        if snake["id"] != game_state["you"]["id"]
-    ]
-    max_snake_length = max(other_snakes_lengths) if other_snakes_lengths else 0
+    max_snake_length = max(
+        (length for snake_id, length in snake_lengths.items() if snake_id != my_id),
+        default=0,
+    )
 
     # Prioritize food if health is low or we're not the longest snake
     if (
         my_health < LOW_HEALTH_THRESHOLD
         or my_length <= max_snake_length + LENGTH_ADVANTAGE_THRESHOLD
     ):
-        food_move = seek_food(game_state, safe_moves)
+        food_move = seek_food(game_state, safe_moves, ctx, parents, distances)
         if food_move:
             return {"move": food_move}
 
     # Try to chase a smaller snake if we're not prioritizing food
-    chase_move = chase_smaller_snake(game_state, safe_moves)
+    chase_move = chase_smaller_snake(game_state, safe_moves, ctx, parents)
     if chase_move:
         return {"move": chase_move}
 
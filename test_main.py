@@ -0,0 +1,34 @@
+import unittest
+
+import main
+
+
+def make_snake(snake_id: str, body: list, health: int = 90) -> dict:
+    return {
+        "id": snake_id,
+        "health": health,
+        "body": [{"x": x, "y": y} for x, y in body],
+    }
+
+
+class LeastBadMoveTest(unittest.TestCase):
+    def test_prefers_head_to_head_risk_over_certain_death(self):
+        # Up is the longer snake's neck, down our own neck, left the wall;
+        # only right (next to the other head) can survive.
+        me = make_snake("me", [(0, 5), (0, 4), (0, 3)])
+        other = make_snake("other", [(1, 6), (0, 6), (0, 7), (0, 8)])
+        game_state = {
+            "board": {
+                "width": 11,
+                "height": 11,
+                "snakes": [me, other],
+                "food": [],
+            },
+            "you": me,
+        }
+
+        self.assertEqual(main.move(game_state), {"move": "right"})
+
+
+if __name__ == "__main__":
+    unittest.main()